@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import environ
 import os
+import sys
 import dj_database_url
 
 
@@ -45,6 +46,52 @@ DEBUG = True
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
 
+# Periodic tasks run by `celery -A alx_travel_app beat`
+CELERY_BEAT_SCHEDULE = {
+    'expire-stale-bookings': {
+        'task': 'listings.tasks.expire_stale_bookings',
+        'schedule': env.int('BOOKING_EXPIRY_INTERVAL_SECONDS', default=300),
+    },
+    'archive-history': {
+        'task': 'listings.tasks.archive_history',
+        'schedule': env.int('ARCHIVE_INTERVAL_SECONDS', default=86400),
+    },
+    'prune-tombstones': {
+        'task': 'listings.tasks.prune_tombstones',
+        'schedule': 86400,
+    },
+}
+
+# Stale pending booking expiry
+BOOKING_PENDING_TTL_HOURS = env.int('BOOKING_PENDING_TTL_HOURS', default=48)
+BOOKING_EXPIRY_BATCH_SIZE = env.int('BOOKING_EXPIRY_BATCH_SIZE', default=1000)
+# Upper bound on batches per condition per run, keeps a single run short
+BOOKING_EXPIRY_MAX_BATCHES = env.int('BOOKING_EXPIRY_MAX_BATCHES', default=100)
+
+# Archival of finished bookings and old reviews
+ARCHIVE_RETENTION_DAYS = env.int('ARCHIVE_RETENTION_DAYS', default=365)
+ARCHIVE_BATCH_SIZE = env.int('ARCHIVE_BATCH_SIZE', default=1000)
+ARCHIVE_MAX_BATCHES = env.int('ARCHIVE_MAX_BATCHES', default=500)
+
+# Rows fetched per query by the streaming export endpoints
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+
+# Review search: 'fulltext' (MySQL FULLTEXT), 'inverted' (ReviewTerm table)
+# or 'auto' to use FULLTEXT on MySQL. Run the rebuild_review_search_index
+# task after switching to 'inverted'.
+REVIEW_SEARCH_BACKEND = env('REVIEW_SEARCH_BACKEND', default='auto')
+# How long the review count used for tf-idf weights is cached
+REVIEW_SEARCH_TOTAL_CACHE_SECONDS = env.int('REVIEW_SEARCH_TOTAL_CACHE_SECONDS', default=600)
+
+# Admin changelists show estimated counts above this many rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Change feed (/changes/)
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+# Consumers that fall further behind than this must resync
+TOMBSTONE_RETENTION_DAYS = env.int('TOMBSTONE_RETENTION_DAYS', default=30)
+
 
 
 ALLOWED_HOSTS = ['*']
@@ -78,11 +125,14 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,
+    'DEFAULT_AUTO_SCHEMA_CLASS': 'alx_travel_app.swagger.TravelAutoSchema',
 }
 
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'listings.middleware.LoadSheddingMiddleware',
+    'listings.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -92,6 +142,35 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+REST_FRAMEWORK = {
+    # Render JSON without whitespace
+    'COMPACT_JSON': True,
+    # Token-bucket throttles, only applied to write requests
+    'DEFAULT_THROTTLE_CLASSES': [
+        'listings.throttling.ClientWriteThrottle',
+        'listings.throttling.EndpointWriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'client_write': env('THROTTLE_CLIENT_WRITE', default='120/min'),
+        'endpoint_write': env('THROTTLE_ENDPOINT_WRITE', default='60/min'),
+        'endpoint_write.booking-create': env('THROTTLE_BOOKING_CREATE', default='20/min'),
+    },
+}
+
+# Shed write requests while Celery or the database is overloaded
+LOAD_SHEDDING = {
+    'ENABLED': env.bool('LOAD_SHEDDING_ENABLED', default=True),
+    'FORCE': env.bool('LOAD_SHEDDING_FORCE', default=False),
+    'QUEUE_NAME': 'celery',
+    'MAX_QUEUE_DEPTH': env.int('LOAD_SHEDDING_MAX_QUEUE_DEPTH', default=5000),
+    'MAX_DB_LATENCY_MS': env.int('LOAD_SHEDDING_MAX_DB_LATENCY_MS', default=250),
+    'CHECK_INTERVAL': 5,
+    'RETRY_AFTER': 30,
+}
+
+# Responses smaller than this many bytes are not compressed
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=1024)
+
 ROOT_URLCONF = 'alx_travel_app.urls'
 
 TEMPLATES = [
@@ -116,17 +195,42 @@ WSGI_APPLICATION = 'alx_travel_app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        # 'ENGINE': 'django.db.backends.mysql', 
-        'default': dj_database_url.config(default=os.getenv('DATABASE_URL'), engine='django.db.backends.mysql'), 
-        'NAME': env('DB_NAME'),  
-        'USER': env('DB_USER'), 
-        'PASSWORD': env('DB_PASSWORD'),  
-        'HOST': env('DB_HOST'),  
-        'PORT': env('DB_PORT', default='3306'), # Default MySQL port is 3306
+if 'test' in sys.argv:
+    # Run the test suite against SQLite, no MySQL server needed
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            # 'ENGINE': 'django.db.backends.mysql', 
+            'default': dj_database_url.config(default=os.getenv('DATABASE_URL'), engine='django.db.backends.mysql'), 
+            'NAME': env('DB_NAME'),  
+            'USER': env('DB_USER'), 
+            'PASSWORD': env('DB_PASSWORD'),  
+            'HOST': env('DB_HOST'),  
+            'PORT': env('DB_PORT', default='3306'), # Default MySQL port is 3306
+        }
+    }
+
+
+# Cache, also used for throttle buckets and metrics counters
+if 'test' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env('REDIS_CACHE_URL', default='redis://redis:6379/1'),
+        }
     }
-}
 
 
 # Password validation
@@ -0,0 +1,26 @@
+"""
+Django settings for the Celery worker and beat processes.
+
+Same as `alx_travel_app.settings`, minus the apps that only serve HTTP
+requests (admin, sessions, messages, static files, API docs, CORS), so
+worker processes start faster and use less memory.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+WEB_ONLY_APPS = {
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'rest_framework',
+    'corsheaders',
+    'drf_yasg',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in WEB_ONLY_APPS]
+
+MIDDLEWARE = []
+
+ROOT_URLCONF = 'alx_travel_app.urls_worker'
@@ -1,7 +1,31 @@
 from rest_framework import permissions
+from drf_yasg.inspectors import SwaggerAutoSchema
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+# This module is only imported when /swagger/ is first requested, see
+# alx_travel_app.urls.swagger_ui.
+
+
+class TravelAutoSchema(SwaggerAutoSchema):
+    """
+    Adds the plain-text response descriptions declared in a view's
+    `swagger_responses` attribute, so views don't import drf_yasg.
+    """
+
+    def get_response_serializers(self):
+        responses = super().get_response_serializers()
+        for status_code, description in getattr(self.view, 'swagger_responses', {}).items():
+            status_code = str(status_code)
+            if status_code in responses:
+                # Keep generated schemas, only fill in empty bodies (e.g. 204)
+                if not responses[status_code]:
+                    responses[status_code] = description
+            elif int(status_code) >= 400:
+                responses[status_code] = description
+        return responses
+
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Alx Travel API",
@@ -14,3 +38,5 @@ schema_view = get_schema_view(
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
+
+swagger_ui_view = schema_view.with_ui('swagger', cache_timeout=0)
@@ -17,7 +17,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.urls import include
-from .swagger import schema_view
+
+
+def swagger_ui(request, *args, **kwargs):
+    """
+    Serve the swagger UI, importing drf_yasg on first use only so that
+    loading the URLconf stays cheap.
+    """
+    from .swagger import swagger_ui_view
+    return swagger_ui_view(request, *args, **kwargs)
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,7 +34,6 @@ urlpatterns = [
     path('api/', include('listings.urls')),
 
     # swagger url
-    path('swagger/', schema_view.with_ui('swagger',
-                                         cache_timeout=0), name='schema-swagger-ui'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
 
 ]
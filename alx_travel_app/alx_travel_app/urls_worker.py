@@ -0,0 +1,9 @@
+"""
+URL configuration for the Celery worker and beat processes.
+
+Workers serve no HTTP requests, but Django's system checks still import
+ROOT_URLCONF at startup, so it must not reference the web-only apps
+removed in `alx_travel_app.settings_worker`.
+"""
+
+urlpatterns = []
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Payload size and compression cost benchmark for the list endpoints.
+
+Seeds a throwaway test database with listings, bookings and reviews,
+fetches /listings/, /bookings/ and /reviews/ in the default and
+`?compact=true` modes, and reports for every available coding the bytes
+on the wire and the CPU time spent compressing each response.
+
+Usage (from the project directory, with the usual .env in place):
+
+    python benchmarks/payload.py [--sizes 10,100,1000] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from listings.middleware import available_encodings, compress  # noqa: E402
+from listings.models import Listing, Booking, Review  # noqa: E402
+
+ENDPOINTS = ['/listings/', '/bookings/', '/reviews/']
+MODES = {'default': '', 'compact': '?compact=true'}
+
+
+def seed(listings, per_listing=3):
+    """
+    Replace the benchmark data with `listings` listings, each with
+    `per_listing` bookings and reviews.
+    """
+    Listing.objects.all().delete()
+    created = Listing.objects.bulk_create([
+        Listing(start_location=f'City {i}', destination=f'Destination {i}',
+                total_price=100 + i)
+        for i in range(listings)
+    ])
+    start = date.today() + timedelta(days=30)
+    Booking.objects.bulk_create([
+        Booking(listing=listing, start_date=start, end_date=start + timedelta(days=7),
+                email=f'guest{j}@example.com')
+        for listing in created for j in range(per_listing)
+    ])
+    Review.objects.bulk_create([
+        Review(listing=listing, rating=1 + j % 5,
+               comment='Great trip, friendly staff and good wifi. ' * (1 + j))
+        for listing in created for j in range(per_listing)
+    ])
+
+
+def measure(content, encoding, repeat):
+    """
+    Return (compressed size, CPU ms per compression) for `content`.
+    """
+    started = time.process_time()
+    for _ in range(repeat):
+        compressed = compress(content, encoding)
+    return len(compressed), (time.process_time() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000',
+                        help='comma-separated numbers of listings to seed')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='compressions per measurement')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    client = Client()
+    encodings = available_encodings()
+    try:
+        print(f"{'listings':>8}  {'endpoint':<11} {'mode':<8} {'identity':>10}  "
+              + '  '.join(f'{e:>10} {"cpu ms":>7}' for e in encodings))
+        for size in (int(s) for s in args.sizes.split(',')):
+            seed(size)
+            for endpoint in ENDPOINTS:
+                for mode, query in MODES.items():
+                    response = client.get(endpoint + query, HTTP_ACCEPT='application/json')
+                    content = response.content
+                    columns = []
+                    for encoding in encodings:
+                        compressed, cpu_ms = measure(content, encoding, args.repeat)
+                        columns.append(f'{compressed:>10} {cpu_ms:>7.2f}')
+                    print(f'{size:>8}  {endpoint:<11} {mode:<8} {len(content):>10}  '
+                          + '  '.join(columns))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
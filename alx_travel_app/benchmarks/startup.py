@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the web and worker entry points.
+
+Runs each entry point in a fresh interpreter with `-X importtime` and
+reports wall-clock start time, peak RSS, total import time and the
+slowest top-level imports. Also reports which of WATCHED_MODULES were
+imported: drf_yasg should never load at startup, and the worker should
+not load the admin or static files apps either.
+
+Usage (from the project directory, with the usual .env in place):
+
+    python benchmarks/startup.py [--runs 5] [--top 10] [--json] [--target wsgi.py]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'manage.py': {
+        'args': ['manage.py', 'check'],
+        'settings': 'alx_travel_app.settings',
+    },
+    'wsgi.py': {
+        'args': ['-c', 'import alx_travel_app.wsgi'],
+        'settings': 'alx_travel_app.settings',
+    },
+    'celery-worker': {
+        'args': ['-c', 'import django; django.setup(); '
+                       'from alx_travel_app.celery import app; '
+                       'app.loader.import_default_modules()'],
+        'settings': 'alx_travel_app.settings_worker',
+    },
+}
+
+# Modules that should only be loaded when actually needed
+WATCHED_MODULES = ['drf_yasg', 'django.contrib.admin', 'django.contrib.staticfiles']
+
+
+def parse_importtime(output):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        tuple: (list of (module, cumulative us) for top-level imports,
+        set of every imported module name)
+    """
+    top_level = []
+    imported = set()
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        if not name.startswith('  '):
+            top_level.append((name.strip(), int(cumulative)))
+    return top_level, imported
+
+
+def run_once(target):
+    """
+    Start `target` in a fresh interpreter and measure it.
+
+    Returns:
+        dict: wall time, peak RSS and import statistics of the run.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=target['settings'])
+    command = [sys.executable, '-X', 'importtime'] + target['args']
+    with tempfile.TemporaryFile(mode='w+') as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=PROJECT_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=stderr)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        output = stderr.read()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{output[-2000:]}")
+
+    top_level, imported = parse_importtime(output)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_kb = usage.ru_maxrss / 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return {
+        'wall_ms': elapsed * 1000,
+        'rss_mb': rss_kb / 1024,
+        'import_ms': sum(cumulative for _, cumulative in top_level) / 1000,
+        'modules': len(imported),
+        'top_level': top_level,
+        'watched': [
+            name for name in WATCHED_MODULES
+            if any(module == name or module.startswith(name + '.') for module in imported)
+        ],
+    }
+
+
+def benchmark(name, runs, top):
+    """
+    Run a target `runs` times and summarise the results using medians.
+    """
+    results = [run_once(TARGETS[name]) for _ in range(runs)]
+    slowest = sorted(results[-1]['top_level'], key=lambda item: item[1], reverse=True)
+    return {
+        'target': name,
+        'runs': runs,
+        'wall_ms': statistics.median(r['wall_ms'] for r in results),
+        'rss_mb': statistics.median(r['rss_mb'] for r in results),
+        'import_ms': statistics.median(r['import_ms'] for r in results),
+        'modules': results[-1]['modules'],
+        'watched_imported': results[-1]['watched'],
+        'slowest_imports': [
+            {'module': module, 'ms': cumulative / 1000}
+            for module, cumulative in slowest[:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='runs per target')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--json', action='store_true', help='print JSON')
+    parser.add_argument('--target', action='append', choices=list(TARGETS),
+                        help='target to run, may be repeated (default: all)')
+    args = parser.parse_args()
+
+    report = [benchmark(name, args.runs, args.top) for name in args.target or TARGETS]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for result in report:
+        print(f"{result['target']}: {result['wall_ms']:.0f} ms wall, "
+              f"{result['import_ms']:.0f} ms imports, {result['rss_mb']:.1f} MB RSS, "
+              f"{result['modules']} modules (median of {result['runs']})")
+        if result['watched_imported']:
+            print(f"  loaded: {', '.join(result['watched_imported'])}")
+        for item in result['slowest_imports']:
+            print(f"  {item['ms']:8.1f} ms  {item['module']}")
+
+
+if __name__ == '__main__':
+    main()
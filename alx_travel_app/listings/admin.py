@@ -1,3 +1,113 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+from .models import Listing, Booking, Review
+from .signals import batched_tombstones
+from .tasks import booking_status_change_email
 
-# Register your models here.
+
+def estimated_row_count(queryset):
+    """
+    Return the planner's row estimate for the table behind `queryset`,
+    or None if the database does not expose one.
+    """
+    db = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with db.cursor() as cursor:
+        if db.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        elif db.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the table statistics instead of COUNT(*) for
+    unfiltered changelists of tables larger than
+    ADMIN_ESTIMATED_COUNT_THRESHOLD rows.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_row_count(self.object_list)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables with millions of rows: estimated counts, no
+    second "full result" COUNT(*) on filtered pages.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def delete_queryset(self, request, queryset):
+        # "Delete selected" can cascade to many rows; write their
+        # tombstones in one insert
+        with batched_tombstones():
+            super().delete_queryset(request, queryset)
+
+
+@admin.register(Listing)
+class ListingAdmin(LargeTableAdmin):
+    list_display = ('listing_id', 'start_location', 'destination', 'total_price', 'created_at')
+    search_fields = ('=listing_id',)
+
+
+@admin.register(Booking)
+class BookingAdmin(LargeTableAdmin):
+    list_display = ('booking_id', 'listing', 'status', 'start_date', 'end_date', 'email',
+                    'created_at')
+    list_select_related = ('listing',)
+    list_filter = ('status', 'start_date', 'end_date')
+    search_fields = ('=booking_id',)
+    raw_id_fields = ('listing',)
+    # Status changes go through the actions below, which enforce
+    # Booking.STATUS_TRANSITIONS and send the notification emails
+    readonly_fields = ('status',)
+    actions = ['confirm_bookings', 'cancel_bookings']
+
+    def transition(self, request, queryset, to_status):
+        """
+        Move the selected pending bookings to `to_status` with one
+        conditional UPDATE over the selection (which is the whole
+        filtered changelist when "select all" is used) and enqueue one
+        notification job that finds the bookings by status and time.
+        """
+        updated, changed_at = queryset.update_status('pending', to_status)
+        if updated:
+            transaction.on_commit(lambda: booking_status_change_email.delay(
+                to_status, changed_at.isoformat()))
+        self.message_user(
+            request, f"{updated} pending booking(s) marked as {to_status}.",
+            messages.SUCCESS)
+
+    @admin.action(description='Confirm selected pending bookings')
+    def confirm_bookings(self, request, queryset):
+        self.transition(request, queryset, 'confirmed')
+
+    @admin.action(description='Cancel selected pending bookings')
+    def cancel_bookings(self, request, queryset):
+        self.transition(request, queryset, 'canceled')
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ('review_id', 'listing', 'rating', 'created_at')
+    list_select_related = ('listing',)
+    list_filter = ('rating',)
+    search_fields = ('=review_id',)
+    raw_id_fields = ('listing',)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .search import create_fulltext_index
+
+        # Connect signal handlers
+        from . import signals  # noqa: F401
+        post_migrate.connect(create_fulltext_index, sender=self)
@@ -0,0 +1,167 @@
+import base64
+import json
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from .models import Listing, Booking, Review, Tombstone
+
+
+# (name, model, timestamp field, payload fields), sorted by name so that
+# (timestamp, name, pk) gives a total order across all sources.
+SOURCES = [
+    ('booking', Booking, 'updated_at',
+     ['listing_id', 'start_date', 'end_date', 'status', 'created_at']),
+    ('listing', Listing, 'updated_at',
+     ['start_location', 'destination', 'total_price', 'created_at']),
+    ('review', Review, 'updated_at',
+     ['listing_id', 'rating', 'comment', 'created_at']),
+    ('tombstone', Tombstone, 'deleted_at',
+     ['model', 'object_id']),
+]
+
+
+class ChangeFeedExpired(APIException):
+    """
+    Raised when tombstones a token still needs may already have been
+    pruned, so deletes may have been missed and the consumer has to
+    resync.
+    """
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Sync token has expired, a full resync is required.'
+    default_code = 'sync_token_expired'
+
+
+def _parse_timestamp(raw):
+    timestamp = parse_datetime(raw)
+    if timestamp is not None and timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+    return timestamp
+
+
+def encode_token(timestamp, source, pk, horizon):
+    """
+    Encode a change feed position as an opaque URL-safe token.
+
+    `horizon` is the earliest deletion time the consumer may still need
+    a tombstone for; the token expires once tombstones from that time
+    can have been pruned.
+    """
+    raw = json.dumps([timestamp.isoformat(), source, pk, horizon.isoformat()])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_token(token):
+    """
+    Decode a token produced by `encode_token`.
+
+    Returns:
+        tuple: ((timestamp, source name, primary key), horizon)
+
+    Raises:
+        ValidationError: If the token is malformed.
+    """
+    try:
+        raw, source, pk, raw_horizon = json.loads(
+            base64.urlsafe_b64decode(token.encode('ascii')))
+        timestamp = _parse_timestamp(raw)
+        horizon = _parse_timestamp(raw_horizon)
+    except (ValueError, TypeError, UnicodeError):
+        timestamp = horizon = None
+    if timestamp is None or horizon is None:
+        raise ValidationError({'since': 'Invalid sync token.'})
+    return (timestamp, source, pk), horizon
+
+
+def _after_position(name, ts_field, timestamp, source, pk):
+    """
+    Build the filter selecting rows of source `name` that come strictly
+    after the position (timestamp, source, pk).
+    """
+    if name > source:
+        return Q(**{f'{ts_field}__gte': timestamp})
+    if name == source:
+        return Q(**{f'{ts_field}__gt': timestamp}) | Q(**{ts_field: timestamp, 'pk__gt': pk})
+    return Q(**{f'{ts_field}__gt': timestamp})
+
+
+def fetch_changes(token=None, limit=None):
+    """
+    Return the next page of changes after `token`.
+
+    Tokens expire when the tombstones they may still need could have been
+    pruned (TOMBSTONE_RETENTION_DAYS), not when the changes they point at
+    are old, so paging through old data and polling a quiet feed keep
+    working.
+
+    Every source is read with an indexed range scan on its timestamp and
+    the results are merged in (timestamp, source, pk) order. Records that
+    were never saved through the ORM (no updated_at) are not part of the
+    feed; use the export endpoints for an initial full sync.
+
+    Args:
+        token (str): Token returned by a previous call, or None to start
+            from the beginning.
+        limit (int): Maximum number of changes to return.
+
+    Returns:
+        dict: The changes, the token to resume from and whether more
+        changes are available.
+    """
+    limit = limit or settings.CHANGE_FEED_PAGE_SIZE
+    started = timezone.now()
+    if token:
+        since, horizon = decode_token(token)
+        if horizon < started - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS):
+            raise ChangeFeedExpired()
+    else:
+        # Nothing has been fetched yet, so no earlier tombstone is needed
+        since, horizon = None, started
+
+    entries = []
+    for name, model, ts_field, fields in SOURCES:
+        queryset = model.objects.filter(**{f'{ts_field}__isnull': False})
+        if since is not None:
+            queryset = queryset.filter(_after_position(name, ts_field, *since))
+        rows = queryset.order_by(ts_field, 'pk').values('pk', ts_field, *fields)[:limit + 1]
+        entries.extend((row.pop(ts_field), name, row.pop('pk'), row) for row in rows)
+
+    entries.sort(key=lambda entry: entry[:3])
+    page = entries[:limit]
+
+    changes = []
+    for timestamp, name, pk, data in page:
+        if name == 'tombstone':
+            changes.append({'model': data['model'], 'id': data['object_id'],
+                            'op': 'deleted', 'updated_at': timestamp})
+            continue
+        created = since is None or data['created_at'] > since[0]
+        changes.append({'model': name, 'id': pk,
+                        'op': 'created' if created else 'updated',
+                        'updated_at': timestamp, 'data': data})
+
+    has_more = len(entries) > limit
+    if not has_more:
+        # Caught up: every tombstone written before this request was
+        # returned by it or an earlier page.
+        horizon = started
+    elif page:
+        # Tombstones up to the new position have been returned
+        horizon = max(horizon, page[-1][0])
+
+    if page:
+        next_token = encode_token(*page[-1][:3], horizon)
+    elif since is not None:
+        # Re-issue the position with a fresh horizon so quiet feeds
+        # don't expire
+        next_token = encode_token(*since, horizon)
+    else:
+        next_token = None
+    return {
+        'changes': changes,
+        'next_token': next_token,
+        'has_more': has_more,
+    }
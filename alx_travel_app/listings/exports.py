@@ -0,0 +1,193 @@
+import csv
+import json
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from .middleware import accepts_encoding
+
+
+BOOKING_EXPORT_FIELDS = ['booking_id', 'listing_id', 'email', 'start_date', 'end_date',
+                         'status', 'created_at', 'updated_at']
+REVIEW_EXPORT_FIELDS = ['review_id', 'listing_id', 'rating', 'comment',
+                        'created_at', 'updated_at']
+
+
+class CSVRenderer(JSONRenderer):
+    """
+    Renderer used to negotiate `?format=csv` for export endpoints.
+    Exports stream their own body; this only renders error payloads.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Renderer used to negotiate `?format=ndjson` for export endpoints.
+    Exports stream their own body; this only renders error payloads.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class Echo:
+    """
+    File-like object that returns what is written instead of storing it,
+    so csv.writer can be used to produce one line at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def parse_cursor(request):
+    """
+    Read the `since` (ISO-8601 updated_at) and `after` (primary key)
+    query parameters used to resume an export.
+
+    Returns:
+        tuple: (since datetime or None, after primary key or None)
+    """
+    since = request.query_params.get('since')
+    after = request.query_params.get('after') or None
+    if not since:
+        if after:
+            raise ValidationError({'after': "'after' requires 'since'."})
+        return None, None
+
+    parsed = parse_datetime(since)
+    if parsed is None:
+        raise ValidationError({'since': 'Expected an ISO-8601 datetime.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed, after
+
+
+def iter_pages(queryset, fields, since=None, after=None, chunk_size=None):
+    """
+    Yield pages of `fields` tuples ordered by (updated_at, pk) using
+    keyset pagination, so memory stays bounded by `chunk_size` on every
+    database backend.
+
+    Rows without an updated_at are exported first on a full export.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    pk_name = queryset.model._meta.pk.name
+    ts_index = fields.index('updated_at')
+    pk_index = fields.index(pk_name)
+
+    if since is None:
+        last_pk = None
+        while True:
+            page = queryset.filter(updated_at__isnull=True)
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            rows = list(page.order_by('pk').values_list(*fields)[:chunk_size])
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                break
+            last_pk = rows[-1][pk_index]
+        keyset = Q(updated_at__isnull=False)
+    elif after is None:
+        keyset = Q(updated_at__gte=since)
+    else:
+        keyset = Q(updated_at__gt=since) | Q(updated_at=since, pk__gt=after)
+
+    while True:
+        rows = list(
+            queryset.filter(keyset)
+            .order_by('updated_at', 'pk')
+            .values_list(*fields)[:chunk_size]
+        )
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            break
+        last_ts, last_pk = rows[-1][ts_index], rows[-1][pk_index]
+        keyset = Q(updated_at__gt=last_ts) | Q(updated_at=last_ts, pk__gt=last_pk)
+
+
+def encode_csv(pages, fields):
+    """
+    Encode pages of rows as CSV text, one string per page.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for rows in pages:
+        yield ''.join(writer.writerow(row) for row in rows)
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder that keeps datetimes at full microsecond precision,
+    so an exported updated_at can be passed back as `since` to resume.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_ndjson(pages, fields):
+    """
+    Encode pages of rows as newline-delimited JSON, one string per page.
+    """
+    for rows in pages:
+        yield ''.join(
+            json.dumps(dict(zip(fields, row)), cls=ExportJSONEncoder) + '\n'
+            for row in rows
+        )
+
+
+def gzip_stream(chunks):
+    """
+    Gzip-compress a stream of text chunks on the fly, flushing after
+    each chunk so the client receives data as it is produced.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(request, queryset, fields, name):
+    """
+    Build a StreamingHttpResponse exporting `queryset` in the format
+    negotiated for the request (csv or ndjson).
+
+    Args:
+        request (Request): The DRF request.
+        queryset (QuerySet): Rows to export.
+        fields (list): Columns to export, must include the pk and updated_at.
+        name (str): Base name of the downloaded file.
+
+    Returns:
+        StreamingHttpResponse: The streamed export.
+    """
+    since, after = parse_cursor(request)
+    renderer = request.accepted_renderer
+    encoder = encode_ndjson if renderer.format == 'ndjson' else encode_csv
+    chunks = encoder(iter_pages(queryset, fields, since, after), fields)
+
+    gzip = accepts_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), 'gzip')
+    response = StreamingHttpResponse(
+        gzip_stream(chunks) if gzip else (chunk.encode('utf-8') for chunk in chunks),
+        content_type=f'{renderer.media_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{renderer.format}"'
+    response['Vary'] = 'Accept-Encoding'
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+
+
+METRICS_PREFIX = 'metrics:'
+
+
+def incr(name, amount=1):
+    """
+    Increment the counter `name` in the shared cache, creating it if
+    needed. Counters are kept until the cache is flushed.
+    """
+    key = METRICS_PREFIX + name
+    if not cache.add(key, amount, timeout=None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # The key expired or was evicted between add() and incr()
+            cache.set(key, amount, timeout=None)
+
+
+def get(name):
+    """
+    Return the current value of the counter `name`.
+    """
+    return cache.get(METRICS_PREFIX + name, 0)
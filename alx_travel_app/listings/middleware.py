@@ -0,0 +1,212 @@
+import logging
+import time
+import redis
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Random padding added to gzip bodies to blunt BREACH-style attacks, as
+# in django.middleware.gzip.GZipMiddleware
+GZIP_MAX_RANDOM_BYTES = 100
+
+
+class LoadSheddingMiddleware:
+    """
+    Rejects write requests with 503 and a Retry-After header while the
+    system is overloaded, i.e. when the Celery queue is deeper than
+    LOAD_SHEDDING['MAX_QUEUE_DEPTH'] or a trivial database query takes
+    longer than LOAD_SHEDDING['MAX_DB_LATENCY_MS'].
+
+    Both probes run at most once every LOAD_SHEDDING['CHECK_INTERVAL']
+    seconds per process. Probe failures do not shed load.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = settings.LOAD_SHEDDING
+        self._broker = None
+        self._checked_at = 0
+        self._reason = None
+
+    def __call__(self, request):
+        if (self.config['ENABLED'] and request.method not in SAFE_METHODS
+                and not request.path.startswith('/admin/')):
+            reason = self.overload_reason()
+            if reason:
+                metrics.incr(f'shed.{reason}')
+                logger.warning("Shedding %s %s: %s", request.method, request.path, reason)
+                response = JsonResponse(
+                    {'detail': 'Service temporarily overloaded, please retry later.'},
+                    status=503)
+                response['Retry-After'] = str(self.config['RETRY_AFTER'])
+                return response
+        return self.get_response(request)
+
+    def overload_reason(self):
+        """
+        Return why the system is overloaded ('forced', 'queue_depth' or
+        'db_latency'), or None if it is not.
+        """
+        if self.config['FORCE']:
+            return 'forced'
+        now = time.monotonic()
+        if now - self._checked_at >= self.config['CHECK_INTERVAL']:
+            self._checked_at = now
+            self._reason = self.probe()
+        return self._reason
+
+    def probe(self):
+        try:
+            if self._broker is None:
+                self._broker = redis.Redis.from_url(
+                    settings.CELERY_BROKER_URL, socket_timeout=0.5)
+            if self._broker.llen(self.config['QUEUE_NAME']) > self.config['MAX_QUEUE_DEPTH']:
+                return 'queue_depth'
+        except redis.RedisError:
+            logger.exception("Could not read Celery queue depth")
+
+        started = time.monotonic()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            logger.exception("Database latency probe failed")
+            return None
+        if (time.monotonic() - started) * 1000 > self.config['MAX_DB_LATENCY_MS']:
+            return 'db_latency'
+        return None
+
+
+def available_encodings():
+    """
+    Return the content codings this process can produce, most preferred
+    first.
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+def compress(content, encoding):
+    """
+    Compress `content` (bytes) with `encoding`. Levels favour speed, as
+    responses are compressed on every request. gzip output is randomly
+    padded by up to GZIP_MAX_RANDOM_BYTES.
+    """
+    if encoding == 'br':
+        return brotli.compress(content, quality=5)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(content)
+    return compress_string(content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    Parse an Accept-Encoding header into a {coding: q-value} dict.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """
+    Return whether an Accept-Encoding header allows `encoding`, i.e. gives
+    it, or failing that `*`, a non-zero q-value.
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    return accepted.get(encoding, accepted.get('*', 0)) > 0
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the preferred available coding allowed by an Accept-Encoding
+    header, or None.
+    """
+    for encoding in available_encodings():
+        if accepts_encoding(accept_encoding, encoding):
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best coding the client accepts: brotli
+    or zstd when their packages are installed, gzip otherwise. Bodies
+    smaller than COMPRESSION_MIN_SIZE bytes are sent as is. Streaming
+    responses are only gzip-compressed.
+
+    HTML pages and responses that used the CSRF token are never
+    compressed: they can reflect request input next to a secret, which
+    makes them open to BREACH, and brotli/zstd output can't be padded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.has_header('Content-Encoding')
+                or response.get('Content-Type', '').startswith('text/html')
+                or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if (getattr(response, 'is_async', False)
+                    or not accepts_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''),
+                                            'gzip')):
+                return response
+            encoding = 'gzip'
+            response.streaming_content = compress_sequence(
+                response.streaming_content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The representation changed, so a strong ETag no longer matches
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
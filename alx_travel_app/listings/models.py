@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import uuid
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -31,10 +32,82 @@ class Listing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Used by the change feed
+            models.Index(fields=['updated_at'], name='listing_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.start_location} to {self.destination}"
 
 
+class BookingQuerySet(models.QuerySet):
+    """
+    QuerySet with bulk helpers for booking status changes.
+    """
+
+    def transition(self, from_status, to_status):
+        """
+        Move every booking in this queryset that is currently in
+        `from_status` to `to_status` with a single UPDATE statement.
+
+        Args:
+            from_status (str): Status the bookings must currently have.
+            to_status (str): Status to move the bookings to.
+
+        Returns:
+            list: IDs of the bookings that were transitioned.
+
+        Raises:
+            ValueError: If the transition is not allowed.
+        """
+        if not Booking.can_transition(from_status, to_status):
+            raise ValueError(
+                f"Cannot transition bookings from '{from_status}' to '{to_status}'.")
+
+        with transaction.atomic():
+            # Lock the matching rows so the returned IDs are exactly the
+            # rows touched by the UPDATE below.
+            booking_ids = list(
+                self.filter(status=from_status)
+                .select_for_update()
+                .values_list('booking_id', flat=True)
+            )
+            if booking_ids:
+                Booking.objects.filter(
+                    booking_id__in=booking_ids, status=from_status
+                ).update(status=to_status, updated_at=timezone.now())
+        return booking_ids
+
+    def update_status(self, from_status, to_status):
+        """
+        Move every booking in this queryset that is currently in
+        `from_status` to `to_status` with one conditional UPDATE, without
+        loading their IDs. Meant for selections too large to list, e.g.
+        "select all" on a filtered admin changelist; the moved bookings
+        can be found again by their new status and updated_at.
+
+        Args:
+            from_status (str): Status the bookings must currently have.
+            to_status (str): Status to move the bookings to.
+
+        Returns:
+            tuple: (number of bookings moved, their new updated_at)
+
+        Raises:
+            ValueError: If the transition is not allowed.
+        """
+        if not Booking.can_transition(from_status, to_status):
+            raise ValueError(
+                f"Cannot transition bookings from '{from_status}' to '{to_status}'.")
+
+        changed_at = timezone.now()
+        updated = self.filter(status=from_status).update(
+            status=to_status, updated_at=changed_at)
+        return updated, changed_at
+
+
 class Booking(models.Model):
     """
     Model to represent a booking for a listing.
@@ -43,8 +116,22 @@ class Booking(models.Model):
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
         ('canceled', 'Canceled'),
+        ('expired', 'Expired'),
     ]
 
+    # Allowed status changes: current status -> reachable statuses
+    STATUS_TRANSITIONS = {
+        'pending': ('confirmed', 'canceled'),
+        'confirmed': (),
+        'canceled': (),
+        'expired': (),
+    }
+    # Changes only made by the system (the expire_stale_bookings task),
+    # never accepted from API clients or admin actions
+    SYSTEM_TRANSITIONS = {
+        'pending': ('expired',),
+    }
+
     booking_id = models.CharField(
         primary_key=True,
         default=generate_uuid,
@@ -74,9 +161,35 @@ class Booking(models.Model):
     email = models.EmailField(help_text="Email of the customer", null=True, 
     blank=True)
 
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Used by the stale pending booking sweep
+            models.Index(fields=['status', 'created_at'],
+                         name='booking_status_created_idx'),
+            models.Index(fields=['status', 'start_date'],
+                         name='booking_status_start_idx'),
+            # Used by the archival job and the admin date filters
+            models.Index(fields=['end_date'], name='booking_end_date_idx'),
+            models.Index(fields=['start_date'], name='booking_start_date_idx'),
+            # Used by incremental exports and the change feed
+            models.Index(fields=['updated_at'], name='booking_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Booking {self.booking_id} for {self.listing}"
 
+    @classmethod
+    def can_transition(cls, from_status, to_status, system=False):
+        """
+        Return True if a booking may move from `from_status` to `to_status`.
+        SYSTEM_TRANSITIONS are only allowed when `system` is True.
+        """
+        if system and to_status in cls.SYSTEM_TRANSITIONS.get(from_status, ()):
+            return True
+        return to_status in cls.STATUS_TRANSITIONS.get(from_status, ())
+
 
 class Review(models.Model):
     """
@@ -106,5 +219,108 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Used by incremental exports and the change feed
+            models.Index(fields=['updated_at'], name='review_updated_idx'),
+            # Used by the admin rating filter
+            models.Index(fields=['rating'], name='review_rating_idx'),
+        ]
+
     def __str__(self):
         return f"Review {self.review_id} - Rating {self.rating}"
+
+
+class ReviewTerm(models.Model):
+    """
+    Model to represent one entry of the inverted index used to search
+    review comments on databases without a native full-text index.
+    """
+    term = models.CharField(max_length=64, help_text="Normalized search term")
+    review = models.ForeignKey(
+        Review,
+        on_delete=models.CASCADE,
+        related_name="terms",
+        help_text="The review containing the term"
+    )
+    frequency = models.PositiveIntegerField(
+        default=1, help_text="Occurrences of the term in the comment")
+
+    class Meta:
+        constraints = [
+            # Also serves as the term -> reviews lookup index
+            models.UniqueConstraint(fields=['term', 'review'], name='review_term_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} in {self.review_id}"
+
+
+class ArchivedBooking(models.Model):
+    """
+    Model to hold bookings moved out of the Booking table once their
+    end date has passed the archive retention window.
+    """
+    booking_id = models.CharField(primary_key=True, max_length=36, editable=False)
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+        help_text="The listing that was booked"
+    )
+    start_date = models.DateField(help_text="Start date of the booking")
+    end_date = models.DateField(help_text="End date of the booking")
+    status = models.CharField(
+        max_length=10,
+        choices=Booking.BOOKING_STATUS_CHOICES,
+        help_text="Status of the booking when it was archived"
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(null=True)
+    email = models.EmailField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['end_date'], name='archived_booking_end_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.booking_id} for {self.listing}"
+
+
+class ArchivedReview(models.Model):
+    """
+    Model to hold reviews moved out of the Review table once they are
+    older than the archive retention window.
+    """
+    review_id = models.CharField(primary_key=True, max_length=36, editable=False)
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="archived_reviews",
+        help_text="The listing that was reviewed"
+    )
+    rating = models.IntegerField(help_text="Rating (1-5)")
+    comment = models.TextField(help_text="Review comment")
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived review {self.review_id} - Rating {self.rating}"
+
+
+class Tombstone(models.Model):
+    """
+    Model to record deleted listings, bookings and reviews so the change
+    feed can report deletes.
+    """
+    model = models.CharField(
+        max_length=20, help_text="Name of the deleted model, e.g. 'booking'")
+    object_id = models.CharField(
+        max_length=36, help_text="Primary key of the deleted record")
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Deleted {self.model} {self.object_id}"
@@ -0,0 +1,135 @@
+import math
+import re
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from .models import Review, ReviewTerm
+
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have i in is it its of on or so
+that the their there this to was we were with you your
+""".split())
+
+FULLTEXT_INDEX_NAME = 'review_comment_fulltext'
+TOTAL_REVIEWS_CACHE_KEY = 'review_search:total'
+
+
+def tokenize(text):
+    """
+    Split `text` into normalized search terms.
+
+    Returns:
+        Counter: Term frequencies.
+    """
+    return Counter(
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    )
+
+
+def use_fulltext(using='default'):
+    """
+    Return True if review search should use the database's native
+    full-text index instead of the ReviewTerm inverted index.
+    """
+    backend = settings.REVIEW_SEARCH_BACKEND
+    if backend == 'auto':
+        return connections[using].vendor == 'mysql'
+    return backend == 'fulltext'
+
+
+def index_review(review):
+    """
+    Replace the inverted index entries of `review` with terms from its
+    current comment.
+    """
+    terms = tokenize(review.comment)
+    with transaction.atomic():
+        ReviewTerm.objects.filter(review=review).delete()
+        ReviewTerm.objects.bulk_create(
+            ReviewTerm(review=review, term=term, frequency=frequency)
+            for term, frequency in terms.items()
+        )
+
+
+def search_reviews(query, listing=None, min_rating=None):
+    """
+    Return reviews matching all terms of `query`, ranked by relevance.
+
+    Args:
+        query (str): Free-text query.
+        listing (str): Only return reviews of this listing ID.
+        min_rating (int): Only return reviews rated at least this.
+
+    Returns:
+        QuerySet: Reviews annotated with a `score`, best match first.
+    """
+    reviews = Review.objects.all()
+    if listing:
+        reviews = reviews.filter(listing_id=listing)
+    if min_rating is not None:
+        reviews = reviews.filter(rating__gte=min_rating)
+
+    terms = list(tokenize(query))
+    if not terms:
+        return reviews.none()
+
+    if use_fulltext():
+        # Boolean mode with every term required, so both backends have
+        # AND semantics. Terms are \w+ runs, so they can't carry operators.
+        against = ' '.join(f'+{term}' for term in terms)
+        score = RawSQL('MATCH (comment) AGAINST (%s IN BOOLEAN MODE)', (against,))
+        return reviews.annotate(score=score).filter(score__gt=0).order_by('-score', 'pk')
+
+    # Weight each term by its inverse document frequency (tf-idf). The
+    # weights barely move as reviews are added, so a cached total is fine.
+    total = cache.get_or_set(TOTAL_REVIEWS_CACHE_KEY, Review.objects.count,
+                             settings.REVIEW_SEARCH_TOTAL_CACHE_SECONDS)
+    document_frequency = dict(
+        ReviewTerm.objects.filter(term__in=terms)
+        .values_list('term').annotate(Count('id'))
+    )
+    if len(document_frequency) < len(terms):
+        return reviews.none()
+    weights = [
+        When(terms__term=term, then=F('terms__frequency') * Value(math.log(1 + total / df)))
+        for term, df in document_frequency.items()
+    ]
+    return (
+        reviews.filter(terms__term__in=terms)
+        .annotate(
+            score=Sum(Case(*weights, output_field=FloatField())),
+            matched=Count('terms'),
+        )
+        .filter(matched=len(terms))
+        .order_by('-score', 'pk')
+    )
+
+
+def create_fulltext_index(sender, using='default', **kwargs):
+    """
+    post_migrate handler adding the MySQL FULLTEXT index on review
+    comments, which Django models cannot declare.
+    """
+    db = connections[using]
+    if db.vendor != 'mysql':
+        return
+    table = Review._meta.db_table
+    with db.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM information_schema.statistics '
+            'WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s',
+            [table, FULLTEXT_INDEX_NAME],
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                f'ALTER TABLE {db.ops.quote_name(table)} '
+                f'ADD FULLTEXT INDEX {FULLTEXT_INDEX_NAME} (comment)'
+            )
@@ -1,8 +1,35 @@
-from rest_framework import serializers
-from .models import Listing, Booking, Review
+from rest_framework import permissions, serializers
+from .models import Listing, Booking, Review, ArchivedBooking, ArchivedReview
 
 
-class ListingSerializer(serializers.HyperlinkedModelSerializer):
+class CompactRelationsMixin:
+    """
+    Renders hyperlinked relations as primary keys when a read request has
+    `?compact=true`, which makes list responses much smaller. Writes
+    always take URLs, so the flag can't change the accepted format.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return fields
+        if request.query_params.get('compact', '').lower() not in ('1', 'true', 'yes'):
+            return fields
+
+        for name, field in fields.items():
+            if (isinstance(field, serializers.ManyRelatedField)
+                    and isinstance(field.child_relation, serializers.HyperlinkedRelatedField)):
+                fields[name] = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+            elif isinstance(field, serializers.HyperlinkedRelatedField):
+                if field.read_only:
+                    fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+                else:
+                    fields[name] = serializers.PrimaryKeyRelatedField(queryset=field.queryset)
+        return fields
+
+
+class ListingSerializer(CompactRelationsMixin, serializers.HyperlinkedModelSerializer):
     """
     Serializer for the Listing model with custom create and update methods.
     """
@@ -52,7 +79,7 @@ class ListingSerializer(serializers.HyperlinkedModelSerializer):
         return instance
 
 
-class BookingSerializer(serializers.HyperlinkedModelSerializer):
+class BookingSerializer(CompactRelationsMixin, serializers.HyperlinkedModelSerializer):
     """
     Serializer for the Booking model with custom create and update methods.
     """
@@ -65,6 +92,23 @@ class BookingSerializer(serializers.HyperlinkedModelSerializer):
         fields = ['booking_id', 'email', 'listing', 'start_date', 'end_date', 'status',
                   'created_at', 'updated_at']  # Serializes specific fields in the Booking model
 
+    def validate_status(self, value):
+        """
+        Ensure new bookings start as pending and an update only moves the
+        booking along an allowed transition. Re-submitting the current
+        status is accepted as a no-op.
+        """
+        if self.instance is None:
+            if value != 'pending':
+                raise serializers.ValidationError("New bookings must start as 'pending'.")
+            return value
+        if value == self.instance.status:
+            return value
+        if not Booking.can_transition(self.instance.status, value):
+            raise serializers.ValidationError(
+                f"Cannot change status from '{self.instance.status}' to '{value}'.")
+        return value
+
     def create(self, validated_data):
         """
         Create and return a new Booking instance.
@@ -97,7 +141,27 @@ class BookingSerializer(serializers.HyperlinkedModelSerializer):
         return instance
 
 
-class ReviewSerializer(serializers.HyperlinkedModelSerializer):
+class BookingTransitionSerializer(serializers.Serializer):
+    """
+    Serializer for bulk booking status transitions.
+    """
+
+    booking_ids = serializers.ListField(
+        child=serializers.CharField(max_length=36), allow_empty=False, max_length=10000)
+    from_status = serializers.ChoiceField(choices=Booking.BOOKING_STATUS_CHOICES)
+    to_status = serializers.ChoiceField(choices=Booking.BOOKING_STATUS_CHOICES)
+
+    def validate(self, attrs):
+        """
+        Reject transitions that the booking state machine does not allow.
+        """
+        if not Booking.can_transition(attrs['from_status'], attrs['to_status']):
+            raise serializers.ValidationError(
+                f"Cannot change status from '{attrs['from_status']}' to '{attrs['to_status']}'.")
+        return attrs
+
+
+class ReviewSerializer(CompactRelationsMixin, serializers.HyperlinkedModelSerializer):
     """
     Serializer for the Review model.
     Handles creation, updates, and validations.
@@ -129,3 +193,44 @@ class ReviewSerializer(serializers.HyperlinkedModelSerializer):
         instance.comment = validated_data.get('comment', instance.comment)
         instance.save()
         return instance
+
+
+class ReviewSearchResultSerializer(ReviewSerializer):
+    """
+    Serializer for review search results, including the relevance score.
+    """
+
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ReviewSerializer.Meta.fields + ['score']
+
+
+class ArchivedBookingSerializer(CompactRelationsMixin, serializers.HyperlinkedModelSerializer):
+    """
+    Read-only serializer for archived bookings.
+    """
+
+    listing = serializers.HyperlinkedRelatedField(
+        view_name='listing-detail', read_only=True)
+
+    class Meta:
+        model = ArchivedBooking
+        fields = ['booking_id', 'email', 'listing', 'start_date', 'end_date', 'status',
+                  'created_at', 'updated_at', 'archived_at']
+        read_only_fields = fields
+
+
+class ArchivedReviewSerializer(CompactRelationsMixin, serializers.HyperlinkedModelSerializer):
+    """
+    Read-only serializer for archived reviews.
+    """
+
+    listing = serializers.HyperlinkedRelatedField(
+        view_name='listing-detail', read_only=True)
+
+    class Meta:
+        model = ArchivedReview
+        fields = ['review_id', 'listing', 'rating', 'comment',
+                  'created_at', 'archived_at']
+        read_only_fields = fields
@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Listing, Booking, Review, Tombstone
+from .search import index_review, use_fulltext
+
+
+# None: write each tombstone as it is recorded, a list: buffer them for
+# one bulk insert, SUPPRESSED: don't record tombstones at all
+_pending_tombstones = ContextVar('pending_tombstones', default=None)
+SUPPRESSED = object()
+
+
+@contextmanager
+def batched_tombstones():
+    """
+    Buffer the tombstones of deletes made inside the block (e.g. a
+    listing cascading to its bookings and reviews) and write them with
+    one bulk insert, in the same transaction as the deletes.
+    """
+    pending = []
+    reset = _pending_tombstones.set(pending)
+    try:
+        with transaction.atomic():
+            yield
+            Tombstone.objects.bulk_create(pending, batch_size=1000)
+    finally:
+        _pending_tombstones.reset(reset)
+
+
+@contextmanager
+def suppressed_tombstones():
+    """
+    Don't record tombstones for deletes made inside the block. Used when
+    rows are moved rather than deleted, e.g. by archival.
+    """
+    reset = _pending_tombstones.set(SUPPRESSED)
+    try:
+        yield
+    finally:
+        _pending_tombstones.reset(reset)
+
+
+@receiver(post_delete, sender=Listing)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Review)
+def record_tombstone(sender, instance, **kwargs):
+    """
+    Record a tombstone for the change feed whenever a listing, booking
+    or review is deleted (including cascades), unless deletes are
+    batched or suppressed.
+    """
+    pending = _pending_tombstones.get()
+    if pending is SUPPRESSED:
+        return
+    tombstone = Tombstone(model=sender._meta.model_name, object_id=instance.pk)
+    if pending is None:
+        tombstone.save()
+    else:
+        pending.append(tombstone)
+
+
+@receiver(post_save, sender=Review)
+def update_review_index(sender, instance, update_fields=None, using='default', **kwargs):
+    """
+    Keep the review search inverted index in sync with the comment.
+    Index rows of deleted reviews are removed by the FK cascade.
+    """
+    if use_fulltext(using):
+        return
+    if update_fields is not None and 'comment' not in update_fields:
+        return
+    index_review(instance)
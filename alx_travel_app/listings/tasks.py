@@ -1,7 +1,17 @@
+import logging
+from datetime import timedelta
 from celery import shared_task
 from django.conf import settings
-from django.core.mail import send_mail
-from .models import Booking
+from django.core.mail import get_connection, send_mail, send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import metrics
+from .models import Booking, Review, ArchivedBooking, ArchivedReview, Tombstone
+from .search import index_review
+from .signals import suppressed_tombstones
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -47,3 +57,210 @@ def booking_confirmation_email(booking_id):
 
     except Booking.DoesNotExist:
         return f"Booking with ID {booking_id} not found."
+
+
+def _send_status_emails(bookings, status, chunk_size=500):
+    """
+    Send a status change e-mail for every booking in `bookings` over one
+    SMTP connection, building at most `chunk_size` messages at a time.
+
+    Returns:
+        int: Number of messages sent.
+    """
+    bookings = (
+        bookings.exclude(email__isnull=True).exclude(email='')
+        .select_related('listing')
+    )
+    sent = 0
+    messages = []
+    with get_connection(fail_silently=False) as connection:
+        for booking in bookings.iterator(chunk_size=chunk_size):
+            subject = f'Booking {status.capitalize()} - {booking.booking_id}'
+            message = (
+                f'Dear Customer,\n\n'
+                f'Your booking has been {status}.\n'
+                f'Booking ID: {booking.booking_id}\n'
+                f'Listing: {booking.listing.start_location} to {booking.listing.destination}\n'
+                f'Start Date: {booking.start_date}\n'
+                f'End Date: {booking.end_date}\n\n'
+                f'Thank you for choosing us!\n'
+            )
+            messages.append(
+                (subject, message, settings.EMAIL_HOST_USER, [booking.email]))
+            if len(messages) >= chunk_size:
+                sent += send_mass_mail(messages, connection=connection)
+                messages = []
+        if messages:
+            sent += send_mass_mail(messages, connection=connection)
+    return sent
+
+
+@shared_task
+def booking_status_batch_email(booking_ids, status):
+    """
+    Task to send e-mail notifications for a batch of bookings that
+    were moved to `status` in a single bulk transition. All messages
+    are sent over one SMTP connection.
+    """
+    return _send_status_emails(
+        Booking.objects.filter(booking_id__in=booking_ids, status=status), status)
+
+
+@shared_task
+def booking_status_change_email(status, changed_at):
+    """
+    Task to send e-mail notifications for the bookings moved to `status`
+    by one BookingQuerySet.update_status() call, found by their status
+    and `changed_at` (ISO-8601) updated_at instead of a list of IDs.
+    """
+    return _send_status_emails(
+        Booking.objects.filter(status=status, updated_at=parse_datetime(changed_at)), status)
+
+
+def _expire_in_batches(queryset, batch_size, max_batches, now):
+    """
+    Expire the pending bookings matched by `queryset` in chunks of
+    `batch_size` rows, each chunk in its own short transaction.
+
+    Returns:
+        tuple: (rows expired, batches run)
+    """
+    expired = batches = 0
+    while batches < max_batches:
+        with transaction.atomic():
+            booking_ids = list(
+                queryset.select_for_update(skip_locked=True)
+                .values_list('booking_id', flat=True)[:batch_size]
+            )
+            if not booking_ids:
+                break
+            expired += Booking.objects.filter(
+                booking_id__in=booking_ids, status='pending'
+            ).update(status='expired', updated_at=now)
+        batches += 1
+        if len(booking_ids) < batch_size:
+            break
+    return expired, batches
+
+
+@shared_task
+def expire_stale_bookings():
+    """
+    Periodic task that expires pending bookings that are older than
+    BOOKING_PENDING_TTL_HOURS or whose start date has already passed.
+
+    Each condition is swept separately so it can use its own
+    (status, created_at) / (status, start_date) index.
+    """
+    now = timezone.now()
+    batch_size = settings.BOOKING_EXPIRY_BATCH_SIZE
+    max_batches = settings.BOOKING_EXPIRY_MAX_BATCHES
+    cutoff = now - timedelta(hours=settings.BOOKING_PENDING_TTL_HOURS)
+
+    pending = Booking.objects.filter(status='pending')
+    by_age, age_batches = _expire_in_batches(
+        pending.filter(created_at__lt=cutoff).order_by('created_at'),
+        batch_size, max_batches, now)
+    by_start, start_batches = _expire_in_batches(
+        pending.filter(start_date__lt=now.date()).order_by('start_date'),
+        batch_size, max_batches, now)
+
+    stats = {
+        'expired_by_age': by_age,
+        'expired_by_start_date': by_start,
+        'expired_total': by_age + by_start,
+        'batches': age_batches + start_batches,
+        'duration_ms': int((timezone.now() - now).total_seconds() * 1000),
+    }
+    metrics.incr('bookings.expired_by_age', by_age)
+    metrics.incr('bookings.expired_by_start_date', by_start)
+    metrics.incr('bookings.expiry_batches', age_batches + start_batches)
+    logger.info("expire_stale_bookings: %s", stats)
+    return stats
+
+
+def _archive_in_batches(queryset, archive_model, batch_size, max_batches):
+    """
+    Copy the rows matched by `queryset` into `archive_model` and delete
+    them from the hot table, `batch_size` rows per transaction.
+
+    Returns:
+        int: Number of rows archived.
+    """
+    fields = [field.attname for field in queryset.model._meta.concrete_fields]
+    archived = batches = 0
+    while batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                queryset.select_for_update(skip_locked=True)
+                .values(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            archive_model.objects.bulk_create(
+                [archive_model(**row) for row in rows], ignore_conflicts=True)
+            # The rows still exist in the archive, so they must not show
+            # up as deleted in the change feed
+            with suppressed_tombstones():
+                queryset.model.objects.filter(
+                    pk__in=[row[queryset.model._meta.pk.attname] for row in rows]
+                ).delete()
+        archived += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return archived
+
+
+@shared_task
+def archive_history():
+    """
+    Periodic task that moves bookings whose end date, and reviews whose
+    creation date, are older than ARCHIVE_RETENTION_DAYS into the
+    archive tables.
+    """
+    started = timezone.now()
+    cutoff = started - timedelta(days=settings.ARCHIVE_RETENTION_DAYS)
+    batch_size = settings.ARCHIVE_BATCH_SIZE
+    max_batches = settings.ARCHIVE_MAX_BATCHES
+
+    bookings = _archive_in_batches(
+        Booking.objects.filter(end_date__lt=cutoff.date()).order_by('end_date'),
+        ArchivedBooking, batch_size, max_batches)
+    reviews = _archive_in_batches(
+        Review.objects.filter(created_at__lt=cutoff).order_by('created_at'),
+        ArchivedReview, batch_size, max_batches)
+
+    stats = {
+        'archived_bookings': bookings,
+        'archived_reviews': reviews,
+        'duration_ms': int((timezone.now() - started).total_seconds() * 1000),
+    }
+    logger.info("archive_history: %s", stats)
+    return stats
+
+
+@shared_task
+def prune_tombstones():
+    """
+    Periodic task that deletes change feed tombstones older than
+    TOMBSTONE_RETENTION_DAYS.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    logger.info("prune_tombstones: deleted %s tombstones", deleted)
+    return deleted
+
+
+@shared_task
+def rebuild_review_search_index(batch_size=1000):
+    """
+    Task to rebuild the review search inverted index for every review,
+    e.g. after switching REVIEW_SEARCH_BACKEND to 'inverted'.
+    """
+    indexed = 0
+    for review in Review.objects.only('review_id', 'comment').iterator(chunk_size=batch_size):
+        index_review(review)
+        indexed += 1
+    logger.info("rebuild_review_search_index: indexed %s reviews", indexed)
+    return indexed
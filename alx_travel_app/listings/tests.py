@@ -1,3 +1,671 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import redis
+from datetime import date, timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from .changes import fetch_changes
+from .middleware import CompressionMiddleware
+from .models import Listing, Booking, Review, ReviewTerm, ArchivedBooking, Tombstone
+from .search import search_reviews
+from . import metrics
+from .tasks import archive_history, booking_status_change_email, expire_stale_bookings
+from .views import ArchivePagination
 
-# Create your tests here.
+
+class ListingsAPITestCase(APITestCase):
+    """
+    Base test case with a listing and a clean cache, so throttle buckets
+    don't leak between tests. The load shedding queue-depth probe reads
+    `self.broker`, a mock Redis client reporting an empty queue.
+    """
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('listings.middleware.redis.Redis.from_url')
+        self.broker = patcher.start().return_value
+        self.broker.llen.return_value = 0
+        self.addCleanup(patcher.stop)
+        self.listing = Listing.objects.create(
+            start_location="New York", destination="Paris", total_price=1500)
+
+    def create_booking(self, status='pending', **kwargs):
+        start = kwargs.pop('start_date', date.today() + timedelta(days=30))
+        return Booking.objects.create(
+            listing=self.listing, start_date=start, end_date=start + timedelta(days=7),
+            status=status, email='guest@example.com', **kwargs)
+
+
+@mock.patch('listings.views.booking_confirmation_email.delay')
+class BookingStatusTests(ListingsAPITestCase):
+
+    def test_pending_booking_can_be_confirmed(self, send_email):
+        booking = self.create_booking()
+        response = self.client.patch(
+            f'/bookings/{booking.booking_id}/', {'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'confirmed')
+        send_email.assert_called_once_with(booking.booking_id)
+
+    def test_resubmitting_confirmed_status_does_not_resend_email(self, send_email):
+        booking = self.create_booking(status='confirmed')
+        response = self.client.patch(
+            f'/bookings/{booking.booking_id}/', {'status': 'confirmed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        send_email.assert_not_called()
+
+    def test_disallowed_transitions_are_rejected(self, send_email):
+        for current, requested in [('confirmed', 'pending'), ('canceled', 'confirmed'),
+                                   ('expired', 'pending'), ('pending', 'expired')]:
+            booking = self.create_booking(status=current)
+            response = self.client.patch(
+                f'/bookings/{booking.booking_id}/', {'status': requested}, format='json')
+            self.assertEqual(response.status_code, 400, (current, requested))
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, current)
+        send_email.assert_not_called()
+
+    @mock.patch('listings.views.send_booking_email.delay')
+    def test_new_bookings_must_start_pending(self, send_booking_email, send_email):
+        data = {'listing': f'http://testserver/listings/{self.listing.listing_id}/',
+                'start_date': '2030-01-01', 'end_date': '2030-01-08',
+                'email': 'guest@example.com'}
+        for status in ('confirmed', 'canceled', 'expired'):
+            response = self.client.post('/bookings/', {**data, 'status': status}, format='json')
+            self.assertEqual(response.status_code, 400, status)
+        self.assertFalse(Booking.objects.exists())
+
+        response = self.client.post('/bookings/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'pending')
+        send_booking_email.assert_called_once_with(response.data['booking_id'])
+
+    def test_can_transition(self, send_email):
+        self.assertTrue(Booking.can_transition('pending', 'confirmed'))
+        self.assertTrue(Booking.can_transition('pending', 'canceled'))
+        self.assertFalse(Booking.can_transition('confirmed', 'canceled'))
+        self.assertFalse(Booking.can_transition('unknown', 'confirmed'))
+        # Expiry is left to the expire_stale_bookings task
+        self.assertFalse(Booking.can_transition('pending', 'expired'))
+        self.assertTrue(Booking.can_transition('pending', 'expired', system=True))
+        self.assertFalse(Booking.can_transition('confirmed', 'expired', system=True))
+
+
+@mock.patch('listings.views.booking_status_batch_email.delay')
+class BookingBulkTransitionTests(ListingsAPITestCase):
+
+    def test_transition_updates_only_bookings_in_from_status(self, send_batch):
+        pending = [self.create_booking() for _ in range(3)]
+        confirmed = self.create_booking(status='confirmed')
+        ids = [b.booking_id for b in pending] + [confirmed.booking_id]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/bookings/transition/', {
+                'booking_ids': ids, 'from_status': 'pending', 'to_status': 'canceled',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertCountEqual(response.data['booking_ids'], [b.booking_id for b in pending])
+        self.assertEqual(Booking.objects.filter(status='canceled').count(), 3)
+        confirmed.refresh_from_db()
+        self.assertEqual(confirmed.status, 'confirmed')
+        send_batch.assert_called_once()
+        self.assertCountEqual(send_batch.call_args.args[0], [b.booking_id for b in pending])
+        self.assertEqual(send_batch.call_args.args[1], 'canceled')
+
+    def test_transition_with_no_matching_bookings_sends_nothing(self, send_batch):
+        booking = self.create_booking(status='confirmed')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/bookings/transition/', {
+                'booking_ids': [booking.booking_id], 'from_status': 'pending',
+                'to_status': 'confirmed',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 0)
+        send_batch.assert_not_called()
+
+    def test_disallowed_bulk_transition_is_rejected(self, send_batch):
+        booking = self.create_booking()
+        for from_status, to_status in [('confirmed', 'pending'), ('pending', 'expired')]:
+            response = self.client.post('/bookings/transition/', {
+                'booking_ids': [booking.booking_id], 'from_status': from_status,
+                'to_status': to_status,
+            }, format='json')
+            self.assertEqual(response.status_code, 400, to_status)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'pending')
+        send_batch.assert_not_called()
+
+
+class BookingAdminTests(ListingsAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'password'))
+
+    def test_change_form_does_not_edit_status(self):
+        booking = self.create_booking(status='confirmed')
+        response = self.client.post(f'/admin/listings/booking/{booking.pk}/change/', {
+            'listing': self.listing.pk, 'start_date': booking.start_date,
+            'end_date': booking.end_date, 'email': 'other@example.com',
+            'status': 'pending',
+        })
+        self.assertEqual(response.status_code, 302)
+        booking.refresh_from_db()
+        self.assertEqual(booking.email, 'other@example.com')
+        self.assertEqual(booking.status, 'confirmed')
+
+    def confirm(self, selected, query='', **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(f'/admin/listings/booking/{query}', {
+                    'action': 'confirm_bookings', '_selected_action': selected, **data})
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+
+    @mock.patch('listings.admin.booking_status_change_email.delay')
+    def test_confirm_action_only_moves_pending_bookings(self, send_emails):
+        pending = self.create_booking()
+        canceled = self.create_booking(status='canceled')
+        self.confirm([pending.pk, canceled.pk])
+        pending.refresh_from_db()
+        canceled.refresh_from_db()
+        self.assertEqual(pending.status, 'confirmed')
+        self.assertEqual(canceled.status, 'canceled')
+        send_emails.assert_called_once_with('confirmed', pending.updated_at.isoformat())
+
+    @mock.patch('listings.admin.booking_status_change_email.delay')
+    def test_select_all_runs_one_update_over_the_filtered_changelist(self, send_emails):
+        early = [self.create_booking(start_date=date(2030, 1, 1)) for _ in range(3)]
+        late = [self.create_booking(start_date=date(2031, 1, 1)) for _ in range(2)]
+
+        updates = self.confirm([early[0].pk], '?start_date__lt=2030-06-01',
+                               select_across='1', index='0')
+
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn(early[1].pk, updates[0])
+        statuses = [Booking.objects.get(pk=b.pk).status for b in early + late]
+        self.assertEqual(statuses, ['confirmed'] * 3 + ['pending'] * 2)
+        status, changed_at = send_emails.call_args.args
+
+        self.assertEqual(booking_status_change_email(status, changed_at), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual({m.to[0] for m in mail.outbox}, {'guest@example.com'})
+
+
+@override_settings(BOOKING_PENDING_TTL_HOURS=48, BOOKING_EXPIRY_BATCH_SIZE=2,
+                   BOOKING_EXPIRY_MAX_BATCHES=100)
+class ExpireStaleBookingsTests(ListingsAPITestCase):
+
+    def create_booking(self, status='pending', age_hours=0, **kwargs):
+        booking = super().create_booking(status=status, **kwargs)
+        Booking.objects.filter(pk=booking.pk).update(
+            created_at=timezone.now() - timedelta(hours=age_hours))
+        return booking
+
+    def statuses(self, bookings):
+        return [Booking.objects.get(pk=b.pk).status for b in bookings]
+
+    def test_expires_old_and_started_pending_bookings(self):
+        old = [self.create_booking(age_hours=49) for _ in range(3)]
+        started = [self.create_booking(start_date=date.today() - timedelta(days=1))]
+        fresh = self.create_booking(age_hours=47)
+        untouched = [self.create_booking(status=status, age_hours=100,
+                                         start_date=date.today() - timedelta(days=1))
+                     for status in ('confirmed', 'canceled')]
+
+        stats = expire_stale_bookings()
+
+        self.assertEqual(self.statuses(old + started), ['expired'] * 4)
+        self.assertEqual(self.statuses([fresh] + untouched),
+                         ['pending', 'confirmed', 'canceled'])
+        self.assertEqual(stats['expired_by_age'], 3)
+        self.assertEqual(stats['expired_by_start_date'], 1)
+        self.assertEqual(stats['expired_total'], 4)
+        # 3 old rows in batches of 2, then 1 started row
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(metrics.get('bookings.expired_by_age'), 3)
+        self.assertEqual(metrics.get('bookings.expired_by_start_date'), 1)
+        self.assertEqual(metrics.get('bookings.expiry_batches'), 3)
+
+    @override_settings(BOOKING_EXPIRY_MAX_BATCHES=1)
+    def test_stops_after_max_batches(self):
+        for _ in range(5):
+            self.create_booking(age_hours=49)
+
+        self.assertEqual(expire_stale_bookings()['expired_by_age'], 2)
+        self.assertEqual(Booking.objects.filter(status='pending').count(), 3)
+        self.assertEqual(expire_stale_bookings()['expired_by_age'], 2)
+        self.assertEqual(expire_stale_bookings()['expired_by_age'], 1)
+        self.assertEqual(expire_stale_bookings()['expired_total'], 0)
+
+
+def throttle_rates(rates):
+    """
+    Return REST_FRAMEWORK settings with only `rates` as throttle rates.
+    """
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+
+
+class ThrottlingTests(ListingsAPITestCase):
+
+    def create_listing(self):
+        return self.client.post('/listings/', {
+            'start_location': "Oslo", 'destination': "Rome", 'total_price': '10.00',
+        }, format='json')
+
+    def create_review(self):
+        return self.client.post('/reviews/', {
+            'listing': f'http://testserver/listings/{self.listing.listing_id}/',
+            'rating': 5, 'comment': "Lovely",
+        }, format='json')
+
+    @override_settings(REST_FRAMEWORK=throttle_rates({'client_write': '4/min',
+                                                      'endpoint_write': '2/min'}))
+    def test_client_and_endpoint_buckets(self):
+        self.assertEqual(self.create_listing().status_code, 201)
+        self.assertEqual(self.create_listing().status_code, 201)
+        # The listing-create bucket is empty, the client bucket is not
+        # (but this request still takes a token from it)
+        self.assertEqual(self.create_listing().status_code, 429)
+        self.assertEqual(self.create_review().status_code, 201)
+        # The review-create bucket still has a token, the client bucket doesn't
+        self.assertEqual(self.create_review().status_code, 429)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates({
+        'endpoint_write': '10/min', 'endpoint_write.booking-create': '1/min'}))
+    @mock.patch('listings.views.send_booking_email.delay')
+    def test_endpoint_override(self, send_email):
+        data = {'listing': f'http://testserver/listings/{self.listing.listing_id}/',
+                'start_date': '2030-01-01', 'end_date': '2030-01-08'}
+        self.assertEqual(self.client.post('/bookings/', data, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/bookings/', data, format='json').status_code, 429)
+        self.assertEqual(self.create_listing().status_code, 201)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates({'client_write': '1/min',
+                                                      'endpoint_write': '1/min'}))
+    def test_safe_methods_are_not_throttled(self):
+        for _ in range(5):
+            response = self.client.get('/listings/', HTTP_ACCEPT='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.create_listing().status_code, 201)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates({'endpoint_write': '1/min'}))
+    def test_throttled_response_has_retry_after(self):
+        self.create_listing()
+        response = self.create_listing()
+        self.assertEqual(response.status_code, 429)
+        # One token refills every 60 seconds
+        self.assertTrue(55 <= int(response['Retry-After']) <= 60, response['Retry-After'])
+        self.assertEqual(metrics.get('throttled.endpoint_write'), 1)
+        self.assertEqual(metrics.get('throttled.client_write'), 0)
+
+
+def load_shedding(**config):
+    """
+    Return LOAD_SHEDDING settings with shedding enabled and `config` applied.
+    """
+    return {**settings.LOAD_SHEDDING, 'ENABLED': True, 'RETRY_AFTER': 30, **config}
+
+
+class LoadSheddingTests(ListingsAPITestCase):
+
+    def create_listing(self):
+        return self.client.post('/listings/', {
+            'start_location': "Oslo", 'destination': "Rome", 'total_price': '10.00',
+        }, format='json')
+
+    def assertShed(self, reason):
+        with self.assertLogs('listings.middleware', 'WARNING'):
+            response = self.create_listing()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(metrics.get(f'shed.{reason}'), 1)
+
+    @override_settings(LOAD_SHEDDING=load_shedding())
+    def test_writes_pass_below_thresholds(self):
+        self.assertEqual(self.create_listing().status_code, 201)
+        self.broker.llen.assert_called_once_with('celery')
+
+    @override_settings(LOAD_SHEDDING=load_shedding(MAX_QUEUE_DEPTH=100))
+    def test_deep_queue_sheds_writes(self):
+        self.broker.llen.return_value = 101
+        self.assertShed('queue_depth')
+        response = self.client.get('/listings/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(LOAD_SHEDDING=load_shedding(MAX_DB_LATENCY_MS=-1))
+    def test_slow_database_sheds_writes(self):
+        self.assertShed('db_latency')
+
+    @override_settings(LOAD_SHEDDING=load_shedding(FORCE=True))
+    def test_forced_shedding_exempts_admin(self):
+        self.assertShed('forced')
+        response = self.client.post('/admin/login/', {'username': 'x', 'password': 'y'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(LOAD_SHEDDING=load_shedding(MAX_QUEUE_DEPTH=100))
+    def test_broker_errors_do_not_shed(self):
+        self.broker.llen.side_effect = redis.ConnectionError
+        with self.assertLogs('listings.middleware', 'ERROR'):
+            self.assertEqual(self.create_listing().status_code, 201)
+
+
+class ChangeFeedTests(ListingsAPITestCase):
+
+    def follow(self, token=None, limit=2):
+        """
+        Page through the feed from `token` until it is caught up.
+        """
+        changes = []
+        while True:
+            page = fetch_changes(token, limit)
+            changes += page['changes']
+            token = page['next_token']
+            if not page['has_more']:
+                return changes, token
+
+    def test_pages_through_old_data(self):
+        for i in range(4):
+            Listing.objects.create(start_location=f"City {i}", destination="Rome",
+                                   total_price=100)
+        Listing.objects.update(updated_at=timezone.now() - timedelta(days=60))
+
+        changes, _ = self.follow()
+
+        self.assertEqual(len(changes), 5)
+        self.assertEqual({c['op'] for c in changes}, {'created'})
+        self.assertEqual(len({c['id'] for c in changes}), 5)
+
+    def test_quiet_feed_does_not_expire(self):
+        _, token = self.follow()
+        now = timezone.now()
+        for days in (20, 40, 60):
+            with mock.patch('listings.changes.timezone.now',
+                            return_value=now + timedelta(days=days)):
+                page = fetch_changes(token)
+            self.assertEqual(page['changes'], [])
+            token = page['next_token']
+
+    def test_token_expires_after_tombstone_retention(self):
+        _, token = self.follow()
+        later = timezone.now() + timedelta(days=31)
+        with mock.patch('listings.changes.timezone.now', return_value=later):
+            response = self.client.get('/changes/', {'since': token})
+        self.assertEqual(response.status_code, 410)
+
+    def test_updates_and_deletes_after_token(self):
+        booking = self.create_booking()
+        booking_id = booking.booking_id
+        _, token = self.follow()
+
+        self.listing.destination = "Lisbon"
+        self.listing.save()
+        booking.delete()
+
+        response = self.client.get('/changes/', {'since': token})
+        self.assertEqual(response.status_code, 200)
+        changes = [(c['model'], c['id'], c['op']) for c in response.data['changes']]
+        self.assertIn(('listing', self.listing.listing_id, 'updated'), changes)
+        self.assertIn(('booking', booking_id, 'deleted'), changes)
+
+    def test_cascade_writes_tombstones_in_one_insert(self):
+        for _ in range(3):
+            self.create_booking()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(f'/listings/{self.listing.listing_id}/')
+        self.assertEqual(response.status_code, 204)
+        inserts = [q['sql'] for q in queries.captured_queries
+                   if q['sql'].startswith('INSERT') and Tombstone._meta.db_table in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Tombstone.objects.filter(model='booking').count(), 3)
+        self.assertEqual(Tombstone.objects.filter(model='listing').count(), 1)
+
+    def test_archived_rows_are_not_reported_as_deleted(self):
+        start = date.today() - timedelta(days=400)
+        booking = self.create_booking(start_date=start)
+        _, token = self.follow()
+
+        archive_history()
+
+        self.assertTrue(ArchivedBooking.objects.filter(pk=booking.pk).exists())
+        self.assertFalse(Tombstone.objects.exists())
+        changes, _ = self.follow(token)
+        self.assertEqual(changes, [])
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.get('/changes/', {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchivedReadTests(ListingsAPITestCase):
+
+    def archive_bookings(self, listing, count):
+        start = date.today() - timedelta(days=400)
+        ArchivedBooking.objects.bulk_create(
+            ArchivedBooking(booking_id=f'{listing.listing_id[:30]}-{i:05d}', listing=listing,
+                            start_date=start, end_date=start + timedelta(days=7),
+                            status='confirmed', created_at=timezone.now())
+            for i in range(count)
+        )
+
+    def test_list_without_flag_excludes_archive(self):
+        self.create_booking()
+        self.archive_bookings(self.listing, 2)
+        response = self.client.get('/bookings/', HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.data), 1)
+
+    @mock.patch.object(ArchivePagination, 'page_size', 2)
+    def test_archived_rows_are_paginated_and_scoped(self):
+        other = Listing.objects.create(start_location="Oslo", destination="Rome",
+                                       total_price=10)
+        self.create_booking()
+        self.archive_bookings(self.listing, 3)
+        self.archive_bookings(other, 4)
+
+        response = self.client.get('/bookings/', {
+            'include_archived': 'true', 'listing': self.listing.listing_id,
+        }, HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(len(response.data['archived']['results']), 2)
+        self.assertIsNotNone(response.data['archived']['next'])
+
+        response = self.client.get(response.data['archived']['next'],
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.data['archived']['results']), 1)
+        self.assertIsNone(response.data['archived']['next'])
+
+    def test_retrieve_falls_back_to_archive(self):
+        self.archive_bookings(self.listing, 1)
+        booking_id = ArchivedBooking.objects.get().booking_id
+        response = self.client.get(f'/bookings/{booking_id}/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f'/bookings/{booking_id}/', {'include_archived': '1'},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['booking_id'], booking_id)
+
+
+@override_settings(REVIEW_SEARCH_BACKEND='inverted')
+class ReviewSearchTests(ListingsAPITestCase):
+
+    def create_review(self, comment, rating=5):
+        return Review.objects.create(listing=self.listing, rating=rating, comment=comment)
+
+    def search(self, query):
+        return [review.pk for review in search_reviews(query)]
+
+    def test_all_terms_are_required(self):
+        both = self.create_review("Great pool and fast wifi")
+        self.create_review("The pool was cold")
+        self.create_review("Wifi kept dropping")
+        self.assertEqual(self.search("pool wifi"), [both.pk])
+        self.assertEqual(self.search("pool sauna"), [])
+
+        response = self.client.get('/reviews/search/', {'q': 'wifi pool'},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['review_id'] for r in response.data['results']], [both.pk])
+
+    def test_index_follows_comment_updates(self):
+        review = self.create_review("Noisy street")
+        review.comment = "Quiet garden"
+        review.save()
+        self.assertEqual(self.search("noisy"), [])
+        self.assertEqual(self.search("quiet garden"), [review.pk])
+
+        # Saves that don't touch the comment leave the index alone
+        review.rating = 3
+        review.save(update_fields=['rating'])
+        self.assertEqual(self.search("garden"), [review.pk])
+
+    def test_index_rows_are_removed_with_the_review(self):
+        review = self.create_review("Lovely view")
+        review.delete()
+        self.assertFalse(ReviewTerm.objects.exists())
+        self.assertEqual(self.search("view"), [])
+
+    def test_review_count_is_cached_between_searches(self):
+        self.create_review("Lovely view")
+        self.search("view")
+        with CaptureQueriesContext(connection) as queries:
+            self.search("view")
+        self.assertFalse([q for q in queries.captured_queries
+                          if q['sql'].startswith('SELECT COUNT(*)')])
+
+
+@mock.patch('listings.views.send_booking_email.delay')
+class CompactModeTests(ListingsAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.booking = self.create_booking()
+        self.review = Review.objects.create(listing=self.listing, rating=4, comment="Fine")
+
+    def get_listing(self, **params):
+        response = self.client.get('/listings/', params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.data[0]
+
+    def test_compact_renders_ids(self, send_email):
+        listing = self.get_listing(compact='true')
+        self.assertEqual(listing['bookings'], [self.booking.pk])
+        self.assertEqual(listing['reviews'], [self.review.pk])
+
+        response = self.client.get(f'/bookings/{self.booking.pk}/', {'compact': '1'},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.data['listing'], self.listing.pk)
+
+    def test_default_renders_urls(self, send_email):
+        listing = self.get_listing()
+        [booking_url], [review_url] = listing['bookings'], listing['reviews']
+        self.assertRegex(booking_url, rf'^http://testserver/.*bookings/{self.booking.pk}/$')
+        self.assertRegex(review_url, rf'^http://testserver/.*reviews/{self.review.pk}/$')
+
+    def test_writes_take_urls_in_compact_mode(self, send_email):
+        data = {'start_date': '2030-01-01', 'end_date': '2030-01-08'}
+        response = self.client.post('/bookings/?compact=true',
+                                    {**data, 'listing': self.listing.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/bookings/?compact=true', {
+            **data, 'listing': f'http://testserver/listings/{self.listing.pk}/',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertRegex(response.data['listing'], rf'^http://testserver/.*listings/{self.listing.pk}/$')
+
+
+class ExportTests(ListingsAPITestCase):
+
+    def export(self, export_format, **params):
+        response = self.client.get('/bookings/export/', {'format': export_format, **params})
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode('utf-8')
+        if export_format == 'csv':
+            return list(csv.DictReader(io.StringIO(body)))
+        return [json.loads(line) for line in body.splitlines()]
+
+    def create_bookings(self, timestamps):
+        for updated_at in timestamps:
+            booking = self.create_booking()
+            Booking.objects.filter(pk=booking.pk).update(updated_at=updated_at)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_resume_after_delivered_rows(self):
+        base = timezone.now().replace(microsecond=123456)
+        self.create_bookings([base + timedelta(microseconds=i * 10) for i in range(5)])
+        for export_format in ('csv', 'ndjson'):
+            rows = self.export(export_format)
+            self.assertEqual(len(rows), 5)
+            resumed = self.export(export_format, since=rows[1]['updated_at'],
+                                  after=rows[1]['booking_id'])
+            self.assertEqual([r['booking_id'] for r in resumed],
+                             [r['booking_id'] for r in rows[2:]], export_format)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_resume_inside_rows_with_the_same_updated_at(self):
+        # e.g. bookings moved together by a bulk transition
+        self.create_bookings([timezone.now().replace(microsecond=654321)] * 5)
+        for export_format in ('csv', 'ndjson'):
+            rows = self.export(export_format)
+            resumed = self.export(export_format, since=rows[2]['updated_at'],
+                                  after=rows[2]['booking_id'])
+            self.assertEqual([r['booking_id'] for r in resumed],
+                             [r['booking_id'] for r in rows[3:]], export_format)
+            self.assertEqual(self.export(export_format, since=rows[4]['updated_at'],
+                                         after=rows[4]['booking_id']), [])
+
+    def test_export_is_gzipped_only_when_accepted(self):
+        self.create_booking()
+        for accept_encoding, compressed in [('gzip, deflate', True), ('gzip;q=0', False),
+                                            ('identity', False)]:
+            response = self.client.get('/bookings/export/', {'format': 'csv'},
+                                       HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response.status_code, 200)
+            body = b''.join(response.streaming_content)
+            if compressed:
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                body = gzip.decompress(body)
+            else:
+                self.assertFalse(response.has_header('Content-Encoding'), accept_encoding)
+            self.assertIn(b'booking_id', body)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def process(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_json_is_gzipped_with_padding(self):
+        body = b'{"destination": "Paris"}' * 100
+        responses = [self.process(HttpResponse(body, content_type='application/json'))
+                     for _ in range(10)]
+        self.assertEqual(responses[0]['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(responses[0].content), body)
+        self.assertGreater(len({len(r.content) for r in responses}), 1)
+
+    def test_html_is_not_compressed(self):
+        response = self.process(HttpResponse(b'<p>Paris</p>' * 200))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_respects_refused_gzip(self):
+        for accept_encoding, compressed in [('gzip', True), ('gzip;q=0, br', False),
+                                            ('*;q=0.5', True), ('*, gzip;q=0', False)]:
+            response = self.process(
+                StreamingHttpResponse([b'a,b\n'] * 10, content_type='text/csv'),
+                accept_encoding)
+            self.assertEqual(response.has_header('Content-Encoding'), compressed,
+                             accept_encoding)
@@ -0,0 +1,141 @@
+import time
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+from . import metrics
+
+
+# Refill the bucket for the elapsed time, then try to take one token.
+# Runs atomically inside Redis so concurrent workers share one bucket.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill_rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token-bucket throttle for write requests.
+
+    The rate for `scope` is read from DEFAULT_THROTTLE_RATES in the usual
+    'num/period' form: `num` is the bucket size (burst) and the bucket
+    refills at num/period tokens per second. Buckets live in Redis when
+    the cache is Redis-backed; any other cache backend (e.g. locmem in
+    tests) uses a non-atomic fallback.
+    """
+    scope = None
+    cache_alias = 'default'
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_rate(self, request, view):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def parse_rate(self, rate):
+        """
+        Parse a 'num/period' rate into (num, period in seconds).
+        """
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), duration
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def get_client_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return f'ip-{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        rate = self.get_rate(request, view)
+        if rate is None:
+            return True
+
+        capacity, duration = self.parse_rate(rate)
+        self.refill_rate = capacity / duration
+        key = self.get_cache_key(request, view)
+        allowed, self.tokens = self.consume(key, capacity, self.refill_rate)
+        if not allowed:
+            metrics.incr(f'throttled.{self.scope}')
+        return allowed
+
+    def consume(self, key, capacity, refill_rate):
+        """
+        Take one token from the bucket stored under `key`.
+
+        Returns:
+            tuple: (whether a token was taken, tokens left)
+        """
+        now = time.time()
+        cache = self.cache
+        if isinstance(cache, RedisCache):
+            key = cache.make_key(key)
+            client = cache._cache.get_client(key, write=True)
+            allowed, tokens = client.eval(
+                TOKEN_BUCKET_SCRIPT, 1, key, capacity, refill_rate, now)
+            return bool(allowed), float(tokens)
+
+        tokens, ts = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - ts) * refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+        return allowed, tokens
+
+    def wait(self):
+        return max(0, (1 - self.tokens) / self.refill_rate)
+
+
+class ClientWriteThrottle(TokenBucketThrottle):
+    """
+    Limits the total write rate of a single client across all endpoints.
+    """
+    scope = 'client_write'
+
+    def get_cache_key(self, request, view):
+        return f'throttle:{self.scope}:{self.get_client_ident(request)}'
+
+
+class EndpointWriteThrottle(TokenBucketThrottle):
+    """
+    Limits the write rate of a single client on a single endpoint.
+
+    A rate named '<scope>.<basename>-<action>' (e.g.
+    'endpoint_write.booking-create') overrides the default for that
+    endpoint.
+    """
+    scope = 'endpoint_write'
+
+    def get_endpoint(self, request, view):
+        name = getattr(view, 'basename', None) or view.__class__.__name__
+        return f"{name}-{getattr(view, 'action', None) or request.method.lower()}"
+
+    def get_rate(self, request, view):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        endpoint_rate = rates.get(f'{self.scope}.{self.get_endpoint(request, view)}')
+        return endpoint_rate or rates.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return (f'throttle:{self.scope}:{self.get_endpoint(request, view)}:'
+                f'{self.get_client_ident(request)}')
@@ -11,4 +11,5 @@ router.register(r'reviews', views.ReviewViewSet, basename="review")
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('changes/', views.ChangeFeedView.as_view(), name='changes'),
 ]
\ No newline at end of file
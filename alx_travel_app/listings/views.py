@@ -1,40 +1,140 @@
-from .models import Listing, Booking, Review
-from .serializers import ListingSerializer, BookingSerializer, ReviewSerializer
-from rest_framework import viewsets
-from .tasks import booking_confirmation_email, send_booking_email
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from .models import Listing, Booking, Review, ArchivedBooking, ArchivedReview
+from .serializers import (ListingSerializer, BookingSerializer, ReviewSerializer,
+                          BookingTransitionSerializer, ArchivedBookingSerializer,
+                          ArchivedReviewSerializer, ReviewSearchResultSerializer)
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .changes import fetch_changes
+from .search import search_reviews
+from .signals import batched_tombstones
+from .exports import (CSVRenderer, NDJSONRenderer, BOOKING_EXPORT_FIELDS,
+                      REVIEW_EXPORT_FIELDS, export_response)
+from .tasks import (booking_confirmation_email, send_booking_email,
+                    booking_status_batch_email)
+
+
+class ArchivePagination(CursorPagination):
+    """
+    Keyset pagination over an archive table, so reading it never counts
+    or offsets into the (large) table.
+    """
+    page_size = 100
+    page_size_query_param = 'archived_page_size'
+    max_page_size = 1000
+    cursor_query_param = 'archived_cursor'
+    ordering = 'pk'
+
+
+class ArchivedReadMixin:
+    """
+    Makes archived rows readable through `list` and `retrieve` when the
+    request carries `?include_archived=true`.
+
+    With the flag, `list` returns `{"results": [...], "archived": {...}}`
+    where `archived` holds one page of archived rows and the links to
+    the neighbouring pages. `?listing=<listing_id>` scopes both.
+    """
+    archive_model = None
+    archive_serializer_class = None
+
+    def include_archived(self):
+        value = self.request.query_params.get('include_archived', '')
+        return value.lower() in ('1', 'true', 'yes')
+
+    def filter_by_listing(self, queryset):
+        listing = self.request.query_params.get('listing')
+        return queryset.filter(listing_id=listing) if listing else queryset
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = self.filter_by_listing(queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not self.include_archived():
+            return response
+
+        paginator = ArchivePagination()
+        page = paginator.paginate_queryset(
+            self.filter_by_listing(self.archive_model.objects.all()), request, view=self)
+        archived = self.archive_serializer_class(
+            page, many=True, context=self.get_serializer_context())
+        response.data = {
+            'results': response.data,
+            'archived': {
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'results': archived.data,
+            },
+        }
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived():
+                raise
+        instance = get_object_or_404(
+            self.archive_model, pk=kwargs[self.lookup_url_kwarg or self.lookup_field])
+        serializer = self.archive_serializer_class(
+            instance, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+
+class ReviewSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ChangeFeedView(APIView):
+    """
+    Incremental sync feed of created, updated and deleted listings,
+    bookings and reviews. Pass the `next_token` of a response as
+    `?since=` to fetch the following changes.
+    """
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', settings.CHANGE_FEED_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        limit = max(1, min(limit, settings.CHANGE_FEED_MAX_PAGE_SIZE))
+        return Response(fetch_changes(request.query_params.get('since'), limit))
 
 
 class ListingViewSet(viewsets.ModelViewSet):
-    queryset = Listing.objects.all()
+    # Related bookings and reviews are only rendered as links or IDs,
+    # so prefetch just their keys in one query each.
+    queryset = Listing.objects.prefetch_related(
+        Prefetch('bookings', queryset=Booking.objects.only('booking_id', 'listing_id')),
+        Prefetch('reviews', queryset=Review.objects.only('review_id', 'listing_id')),
+    )
     serializer_class = ListingSerializer
 
-    @swagger_auto_schema(
-        responses={
-        200: openapi.Response(
-            description="Listing retrieved successfully."
-        ),
-        201: openapi.Response(
-            description="Listing created successfully."
-        ),
-        204: openapi.Response(
-            description="No content. The listing has been successfully deleted."
-        ),
-        400: openapi.Response(
-            description="Bad Request. The request was invalid or missing required fields."
-        ),
-        401: openapi.Response(
-            description="Unauthorized. Authentication credentials were missing or invalid."
-        ),
-        403: openapi.Response(
-            description="Forbidden. You do not have permission to perform this action."
-        ),
-        404: openapi.Response(
-            description="Not Found. The requested listing does not exist."
-        ),
-    },
-    )
+    # Response descriptions for the API docs, applied lazily by
+    # alx_travel_app.swagger.TravelAutoSchema
+    swagger_responses = {
+        200: "Listing retrieved successfully.",
+        201: "Listing created successfully.",
+        204: "No content. The listing has been successfully deleted.",
+        400: "Bad Request. The request was invalid or missing required fields.",
+        401: "Unauthorized. Authentication credentials were missing or invalid.",
+        403: "Forbidden. You do not have permission to perform this action.",
+        404: "Not Found. The requested listing does not exist.",
+    }
 
     def perform_create(self, serializer):
         """
@@ -42,28 +142,29 @@ class ListingViewSet(viewsets.ModelViewSet):
         """
         serializer.save()
 
+    def perform_destroy(self, instance):
+        """
+        Delete the listing and its bookings and reviews, writing their
+        tombstones in one insert.
+        """
+        with batched_tombstones():
+            instance.delete()
+
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(ArchivedReadMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
+    archive_model = ArchivedBooking
+    archive_serializer_class = ArchivedBookingSerializer
+
+    swagger_responses = {
+        200: "Booking retrieved successfully",
+        204: "No content. The requested resource has been successfully processed, but there is no content to return.",
+        400: "Bad Request. The request was invalid or missing required fields.",
+        401: "Unauthorized. Authentication credentials were missing or invalid.",
+    }
 
-    @swagger_auto_schema(
-        responses={
-            200: openapi.Response(
-                description="Booking retrieved successfully",
-            ),
-            204: openapi.Response(
-                description="No content. The requested resource has been successfully processed, but there is no content to return."
-            ),
-            400: openapi.Response(
-                description="Bad Request. The request was invalid or missing required fields.",
-            ),
-            401: openapi.Response(
-                description="Unauthorized. Authentication credentials were missing or invalid.",
-            ),
-        },
-    )
     def perform_create(self, serializer):
         """
         Save the booking instance and trigger the email task.
@@ -75,45 +176,103 @@ class BookingViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         """
-        Update the booking instance and trigger the email task.
+        Update the booking instance and trigger the email task when the
+        booking has just been confirmed.
         """
+        previous_status = serializer.instance.status
         instance = serializer.save()
-        if instance.status == 'confirmed':
+        if instance.status == 'confirmed' and previous_status != 'confirmed':
             booking_confirmation_email.delay(instance.booking_id)
 
+    @action(detail=False, methods=['post'], url_path='transition')
+    def transition(self, request):
+        """
+        Move many bookings from one status to another in a single UPDATE
+        and enqueue one batched notification job for the whole transition.
+        """
+        serializer = BookingTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        from_status = serializer.validated_data['from_status']
+        to_status = serializer.validated_data['to_status']
+
+        with transaction.atomic():
+            booking_ids = Booking.objects.filter(
+                booking_id__in=serializer.validated_data['booking_ids']
+            ).transition(from_status, to_status)
+            if booking_ids:
+                transaction.on_commit(
+                    lambda: booking_status_batch_email.delay(booking_ids, to_status))
+
+        return Response({
+            'from_status': from_status,
+            'to_status': to_status,
+            'updated': len(booking_ids),
+            'booking_ids': booking_ids,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export',
+            renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream all bookings as CSV or NDJSON, optionally only those
+        updated since `?since=` (resume with `?since=&after=<booking_id>`).
+        """
+        return export_response(request, Booking.objects.all(),
+                               BOOKING_EXPORT_FIELDS, 'bookings')
+
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ArchivedReadMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    archive_model = ArchivedReview
+    archive_serializer_class = ArchivedReviewSerializer
+
+    swagger_responses = {
+        200: "Review retrieved successfully.",
+        201: "Review created successfully.",
+        204: "No content. The review has been successfully deleted.",
+        400: "Bad Request. The request was invalid or missing required fields.",
+        401: "Unauthorized. Authentication credentials were missing or invalid.",
+        403: "Forbidden. You do not have permission to perform this action.",
+        404: "Not Found. The requested review does not exist.",
+    }
 
-    @swagger_auto_schema(
-        responses={
-            200: openapi.Response(
-            description="Review retrieved successfully."
-        ),
-        201: openapi.Response(
-            description="Review created successfully."
-        ),
-        204: openapi.Response(
-            description="No content. The review has been successfully deleted."
-        ),
-        400: openapi.Response(
-            description="Bad Request. The request was invalid or missing required fields."
-        ),
-        401: openapi.Response(
-            description="Unauthorized. Authentication credentials were missing or invalid."
-        ),
-        403: openapi.Response(
-            description="Forbidden. You do not have permission to perform this action."
-        ),
-        404: openapi.Response(
-            description="Not Found. The requested review does not exist."
-        ),
-        }
-    )
     def perform_create(self, serializer):
         """
         Save the review instance.
         """
         serializer.save()
-    
\ No newline at end of file
+
+    @action(detail=False, methods=['get'], url_path='export',
+            renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream all reviews as CSV or NDJSON, optionally only those
+        updated since `?since=` (resume with `?since=&after=<review_id>`).
+        """
+        return export_response(request, Review.objects.all(),
+                               REVIEW_EXPORT_FIELDS, 'reviews')
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        Full-text search over review comments, best matches first.
+        Supports `?q=`, `?listing=<listing_id>` and `?min_rating=`.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This query parameter is required.'})
+        min_rating = request.query_params.get('min_rating')
+        if min_rating is not None:
+            try:
+                min_rating = int(min_rating)
+            except ValueError:
+                raise ValidationError({'min_rating': 'Expected an integer.'})
+
+        reviews = search_reviews(
+            query, listing=request.query_params.get('listing'), min_rating=min_rating)
+        paginator = ReviewSearchPagination()
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        serializer = ReviewSearchResultSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)